@@ -36,26 +36,91 @@ EasyBuild support for install the Intel C/C++ compiler suite, implemented as an
 
 import os
 import re
-from distutils.version import LooseVersion
+from collections import namedtuple
 
 from easybuild.easyblocks.generic.intelbase import IntelBase, ACTIVATION_NAME_2012, COMP_ALL
 from easybuild.easyblocks.generic.intelbase import LICENSE_FILE_NAME_2012
 from easybuild.easyblocks.t.tbb import get_tbb_gccprefix
+from easybuild.tools.filetools import which
 from easybuild.tools.run import run_cmd
 from easybuild.tools.systemtools import get_shared_lib_ext
 
 
+_ICC_VER_RE = re.compile(r"^icc \(ICC\) (?P<version>[0-9.]+) [0-9]+$", re.M)
+_VERSION_PARTS_RE = re.compile(r"^(?P<major>[0-9]+)(_sp(?P<sp>[0-9]+))?(?P<rest>.*)$")
+_DIGITS_RE = re.compile(r"[0-9]+")
+
+_VersionFlags = namedtuple('_VersionFlags', ['ver', 'major', 'lt_2013_sp1', 'lt_2014', 'ge_2015', 'gt_2015',
+                                             'ge_2016'])
+_VERSION_FLAGS_CACHE = {}
+_MULTIARCH_CACHE = {}
+
+
 def get_icc_version():
     """Obtain icc version string via 'icc --version'."""
     cmd = "icc --version"
     (out, _) = run_cmd(cmd, log_all=True, simple=False)
 
-    ver_re = re.compile("^icc \(ICC\) (?P<version>[0-9.]+) [0-9]+$", re.M)
-    version = ver_re.search(out).group('version')
+    version = _ICC_VER_RE.search(out).group('version')
 
     return version
 
 
+def _get_multiarch():
+    """
+    Determine multiarch subdirectory (e.g. 'x86_64-linux-gnu') via 'gcc -print-multiarch';
+    result is cached per gcc command found in $PATH, to avoid running gcc over and over again
+    """
+    gcc = which('gcc')
+    if gcc not in _MULTIARCH_CACHE:
+        out, ec = run_cmd("gcc -print-multiarch", simple=False, log_all=False, log_ok=False)
+        if ec == 0:
+            _MULTIARCH_CACHE[gcc] = out.strip()
+        else:
+            _MULTIARCH_CACHE[gcc] = ''
+
+    return _MULTIARCH_CACHE[gcc]
+
+
+def _parse_version(version):
+    """
+    Parse icc version string into a tuple of integers, e.g. '2013_sp1.0.080' -> (2013, 1, 0, 80)
+
+    The service pack number is always included as 2nd element (0 if there is none),
+    so that 2013_sp1 is considered more recent than 2013.5.192
+    """
+    res = _VERSION_PARTS_RE.match(version)
+    if res is None:
+        return ()
+
+    ver = (int(res.group('major')), int(res.group('sp') or 0))
+    return ver + tuple(int(x) for x in _DIGITS_RE.findall(res.group('rest')))
+
+
+_V_2011 = _parse_version('2011')
+_V_2011_3_174 = _parse_version('2011.3.174')
+_V_2013_SP1 = _parse_version('2013_sp1')
+_V_2014 = _parse_version('2014')
+_V_2015 = _parse_version('2015')
+_V_2016 = _parse_version('2016')
+
+
+def _get_version_flags(version):
+    """Determine (and cache) which version-specific code paths apply to the specified icc version."""
+    if version not in _VERSION_FLAGS_CACHE:
+        ver = _parse_version(version)
+        _VERSION_FLAGS_CACHE[version] = _VersionFlags(
+            ver=ver,
+            major=version.split('.')[0],
+            lt_2013_sp1=ver < _V_2013_SP1,
+            lt_2014=ver < _V_2014,
+            ge_2015=ver >= _V_2015,
+            gt_2015=ver > _V_2015,
+            ge_2016=ver >= _V_2016,
+        )
+    return _VERSION_FLAGS_CACHE[version]
+
+
 class EB_icc(IntelBase):
     """Support for installing icc
 
@@ -63,6 +128,30 @@ class EB_icc(IntelBase):
         - will fail for all older versions (due to newer silent installer)
     """
 
+    # (min_version, max_version, binprefix, libprefix) to use in sanity check, both bounds are inclusive;
+    # first matching entry is used, default is ('bin/intel64', 'lib/intel64')
+    _SANITY_CHECK_PREFIXES = [
+        (_V_2011, _V_2011_3_174, 'bin', 'lib/intel64'),
+        (_V_2013_SP1, None, 'bin', 'lib/intel64'),
+        (_V_2011, None, 'bin/intel64', 'compiler/lib/intel64'),
+    ]
+
+    # guesses per environment variables, see make_module_req_guess
+    # some of these paths only apply to certain versions, but that doesn't really matter
+    # existence of paths is checked by module generator before 'prepend-paths' statements are included
+    _BASE_GUESSES = {
+        'CLASSPATH': ('daal/lib/daal.jar',),
+        # 'include' is deliberately omitted, including it causes problems, e.g. with complex.h and std::complex
+        # cfr. https://software.intel.com/en-us/forums/intel-c-compiler/topic/338378
+        'CPATH': ('daal/include', 'ipp/include', 'mkl/include', 'tbb/include'),
+        'DAALROOT': ('daal',),
+        'IPPROOT': ('ipp',),
+        'LD_LIBRARY_PATH': ('lib',),
+        'MANPATH': ('debugger/gdb/intel64/share/man', 'man/common', 'man/en_US', 'share/man'),
+        'PATH': (),
+        'TBBROOT': ('tbb',),
+    }
+
     def __init__(self, *args, **kwargs):
         """Constructor, initialize class variables."""
         super(EB_icc, self).__init__(*args, **kwargs)
@@ -71,7 +160,10 @@ class EB_icc(IntelBase):
 
         self.comp_libs_subdir = None
 
-        if LooseVersion(self.version) >= LooseVersion('2016'):
+        # determined on first use, since it depends on which GCC is available at that point
+        self.tbb_gccprefix = None
+
+        if self.version_flags.ge_2016:
 
             self.comp_libs_subdir = os.path.join('compilers_and_libraries_%s' % self.version, 'linux')
 
@@ -82,6 +174,14 @@ class EB_icc(IntelBase):
                 self.log.debug("Nothing specified for components, but required for version 2016, using %s instead",
                                self.cfg['components'])
 
+    @property
+    def version_flags(self):
+        """
+        Version-specific flags for the current version;
+        not determined once in __init__ since version may still change (cfr. SystemCompiler easyblock)
+        """
+        return _get_version_flags(self.version)
+
     def install_step(self):
         """
         Actual installation
@@ -90,7 +190,7 @@ class EB_icc(IntelBase):
         """
         silent_cfg_names_map = None
 
-        if LooseVersion(self.version) < LooseVersion('2013_sp1'):
+        if self.version_flags.lt_2013_sp1:
             # since icc v2013_sp1, silent.cfg has been slightly changed to be 'more standard'
 
             silent_cfg_names_map = {
@@ -103,24 +203,24 @@ class EB_icc(IntelBase):
     def sanity_check_step(self):
         """Custom sanity check paths for icc."""
 
+        vflags = self.version_flags
+
         binprefix = 'bin/intel64'
         libprefix = 'lib/intel64'
-        if LooseVersion(self.version) >= LooseVersion('2011'):
-            if LooseVersion(self.version) <= LooseVersion('2011.3.174'):
-                binprefix = 'bin'
-            elif LooseVersion(self.version) >= LooseVersion('2013_sp1'):
-                binprefix = 'bin'
-            else:
-                libprefix = 'compiler/lib/intel64'
+        for (min_ver, max_ver, bin_subdir, lib_subdir) in self._SANITY_CHECK_PREFIXES:
+            if min_ver <= vflags.ver and (max_ver is None or vflags.ver <= max_ver):
+                binprefix, libprefix = bin_subdir, lib_subdir
+                break
 
         binfiles = ['icc', 'icpc']
-        if LooseVersion(self.version) < LooseVersion('2014'):
+        if vflags.lt_2014:
             binfiles += ['idb']
 
         binaries = [os.path.join(binprefix, f) for f in binfiles]
-        libraries = [os.path.join(libprefix, 'lib%s' % l) for l in ['iomp5.a', 'iomp5.%s' % get_shared_lib_ext()]]
+        shlib_ext = get_shared_lib_ext()
+        libraries = [os.path.join(libprefix, 'lib' + l) for l in ('iomp5.a', 'iomp5.' + shlib_ext)]
         sanity_check_files = binaries + libraries
-        if LooseVersion(self.version) > LooseVersion('2015'):
+        if vflags.gt_2015:
             sanity_check_files.append('include/omp.h')
 
         custom_paths = {
@@ -142,22 +242,11 @@ class EB_icc(IntelBase):
         Additional paths to consider for prepend-paths statements in module file
         """
         prefix = None
+        prefix_exists = False
+        vflags = self.version_flags
 
-        # guesses per environment variables
-        # some of these paths only apply to certain versions, but that doesn't really matter
-        # existence of paths is checked by module generator before 'prepend-paths' statements are included
-        guesses = {
-            'CLASSPATH': ['daal/lib/daal.jar'],
-            # 'include' is deliberately omitted, including it causes problems, e.g. with complex.h and std::complex
-            # cfr. https://software.intel.com/en-us/forums/intel-c-compiler/topic/338378
-            'CPATH': ['daal/include', 'ipp/include', 'mkl/include', 'tbb/include'],
-            'DAALROOT': ['daal'],
-            'IPPROOT': ['ipp'],
-            'LD_LIBRARY_PATH': ['lib'],
-            'MANPATH': ['debugger/gdb/intel64/share/man', 'man/common', 'man/en_US', 'share/man'],
-            'PATH': [],
-            'TBBROOT': ['tbb'],
-        }
+        # start from (copy of) static guesses, since lists are modified below
+        guesses = dict((key, list(subdirs)) for (key, subdirs) in self._BASE_GUESSES.items())
 
         if self.cfg['m32']:
             # 32-bit toolchain
@@ -176,6 +265,10 @@ class EB_icc(IntelBase):
                 'tbb/bin/intel64',
             ])
 
+            # avoid probing gcc version again each time module file is (re)generated
+            if self.tbb_gccprefix is None:
+                self.tbb_gccprefix = get_tbb_gccprefix()
+
             # in the end we set 'LIBRARY_PATH' equal to 'LD_LIBRARY_PATH'
             guesses['LD_LIBRARY_PATH'].extend([
                 'compiler/lib/intel64',
@@ -183,27 +276,30 @@ class EB_icc(IntelBase):
                 'ipp/lib/intel64',
                 'mkl/lib/intel64',
                 'mpi/intel64',
-                'tbb/lib/intel64/%s' % get_tbb_gccprefix(),
+                'tbb/lib/intel64/%s' % self.tbb_gccprefix,
             ])
 
-            if LooseVersion(self.version) < LooseVersion('2016'):
+            if not vflags.ge_2016:
                 prefix = 'composer_xe_%s' % self.version
+                prefix_exists = os.path.isdir(os.path.join(self.installdir, prefix))
                 # for some older versions, name of subdirectory is slightly different
-                if not os.path.isdir(os.path.join(self.installdir, prefix)):
+                if not prefix_exists:
                     cand_prefix = 'composerxe-%s' % self.version
                     if os.path.isdir(os.path.join(self.installdir, cand_prefix)):
                         prefix = cand_prefix
+                        prefix_exists = True
 
                 # debugger is dependent on $INTEL_PYTHONHOME since version 2015 and newer
-                if LooseVersion(self.version) >= LooseVersion('2015'):
+                if vflags.ge_2015:
                     self.debuggerpath = os.path.join(prefix, 'debugger')
 
             else:
                 # new directory layout for Intel Parallel Studio XE 2016
                 # https://software.intel.com/en-us/articles/new-directory-layout-for-intel-parallel-studio-xe-2016
                 prefix = self.comp_libs_subdir
+                prefix_exists = bool(prefix) and os.path.isdir(os.path.join(self.installdir, prefix))
                 # Debugger requires INTEL_PYTHONHOME, which only allows for a single value
-                self.debuggerpath = 'debugger_%s' % self.version.split('.')[0]
+                self.debuggerpath = 'debugger_%s' % vflags.major
 
                 guesses['LD_LIBRARY_PATH'].extend([
                     os.path.join(self.debuggerpath, 'libipt/intel64/lib'),
@@ -223,14 +319,15 @@ class EB_icc(IntelBase):
         # in deeper directories, and symlinked in top-level directories
         # however, not all binaries are symlinked (e.g. mcpcom is not)
         # we only need to include the deeper directories (same as compilervars.sh)
-        if prefix and os.path.isdir(os.path.join(self.installdir, prefix)):
-            for key, subdirs in guesses.items():
-                guesses[key] = [os.path.join(prefix, subdir) for subdir in subdirs]
-
-            # The for loop above breaks libipt library loading for gdb - this fixes that
-            guesses['LD_LIBRARY_PATH'].append('daal/lib/intel64_lin')
+        if prefix_exists:
+            # prefixing all paths breaks libipt library loading for gdb - these non-prefixed paths fix that
+            extra_ld_library_path = ['daal/lib/intel64_lin']
             if self.debuggerpath:
-                guesses['LD_LIBRARY_PATH'].append(os.path.join(self.debuggerpath, 'libipt/intel64/lib'))
+                extra_ld_library_path.append(os.path.join(self.debuggerpath, 'libipt/intel64/lib'))
+            extras = {'LD_LIBRARY_PATH': extra_ld_library_path}
+
+            guesses = dict((key, [os.path.join(prefix, subdir) for subdir in subdirs] + extras.get(key, []))
+                           for (key, subdirs) in guesses.items())
 
         # only set $IDB_HOME if idb exists
         idb_home_subdir = 'bin/intel64'
@@ -249,9 +346,8 @@ class EB_icc(IntelBase):
                 txt += self.module_generator.set_environment('INTEL_PYTHONHOME', intel_pythonhome)
 
         # on Debian/Ubuntu, /usr/include/x86_64-linux-gnu needs to be included in $CPATH for icc
-        out, ec = run_cmd("gcc -print-multiarch", simple=False, log_all=False, log_ok=False)
-        multiarch_inc_subdir = out.strip()
-        if ec == 0 and multiarch_inc_subdir:
+        multiarch_inc_subdir = _get_multiarch()
+        if multiarch_inc_subdir:
             multiarch_inc_dir = os.path.join('/usr', 'include', multiarch_inc_subdir)
             self.log.info("Adding multiarch include path %s to $CPATH in generated module file", multiarch_inc_dir)
             # system location must be appended at the end, so use append_paths